@@ -0,0 +1,67 @@
+# cython: language_level=3
+# -*- coding: utf-8 -*-
+"""
+Cython编译的树状数组主循环
+
+未安装numba时作为fenwick.compute_positive_diff的编译版本使用，
+数据布局与fenwick.py一致：int32计数树、int64求和树，节点按
+i + (i >> D_SHIFT) 偏移存放。由pyximport按_fenwick.pyxbld中的
+编译参数（-O3 -march=native）在首次导入时构建。
+"""
+
+cimport cython
+from libc.stdint cimport int32_t, int64_t
+
+import numpy as np
+
+cdef enum:
+    D_SHIFT = 4
+
+cdef inline int64_t _o(int64_t i) nogil:
+    """逻辑节点i在数组中的物理位置"""
+    return i + (i >> D_SHIFT)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef int64_t compute(const int64_t[::1] arr, const int64_t[::1] ranks, int64_t size):
+    """
+    计算所有i<j且arr[j]>arr[i]时arr[j]-arr[i]的累加和
+
+    Args:
+        arr: int64数组
+        ranks: 与arr一一对应的1-based坐标压缩结果（int64）
+        size: 不同值的个数，即树状数组大小
+
+    Returns:
+        所有正差值的累加和
+    """
+    cdef int32_t[::1] count_tree = np.zeros(_o(size) + 1, dtype=np.int32)
+    cdef int64_t[::1] sum_tree = np.zeros(_o(size) + 1, dtype=np.int64)
+    cdef Py_ssize_t j, n = arr.shape[0]
+    cdef int64_t idx, pos, current_val, smaller_count, smaller_sum
+    cdef int64_t total_sum = 0
+
+    with nogil:
+        for j in range(n):
+            current_val = arr[j]
+
+            # 一次遍历同时查询比当前元素小的元素个数与元素和
+            smaller_count = 0
+            smaller_sum = 0
+            idx = ranks[j] - 1
+            while idx > 0:
+                pos = _o(idx)
+                smaller_count += count_tree[pos]
+                smaller_sum += sum_tree[pos]
+                idx -= idx & (-idx)
+            total_sum += current_val * smaller_count - smaller_sum
+
+            # 将当前元素加入树状数组
+            idx = ranks[j]
+            while idx <= size:
+                pos = _o(idx)
+                count_tree[pos] += 1
+                sum_tree[pos] += current_val
+                idx += idx & (-idx)
+
+    return total_sum
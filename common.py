@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+各实现共用的辅助函数
+
+只依赖NumPy，供memory_optimized_solution.py与simple_memory_optimized.py
+等脚本直接导入，导入时不会加载其他脚本。
+"""
+
+import gc
+from contextlib import contextmanager
+from typing import List, Tuple
+
+import numpy as np
+
+@contextmanager
+def gc_paused():
+    """
+    计算期间暂停分代垃圾回收
+    主循环中只产生短生命周期的小对象，调度触发的回收只会增加停顿
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+def get_unique_values_streaming(arr: List[int], dtype=np.int32) -> Tuple[np.ndarray, int]:
+    """
+    坐标压缩：使用np.unique在C层完成排序与映射，不再构造集合和字典
+    
+    Args:
+        arr: 输入数组
+        dtype: 排名数组的类型；Python循环用int32节省内存，编译内核使用int64
+    
+    Returns:
+        (ranks, unique_count)，ranks为与arr一一对应的1-based排名
+    """
+    arr_np = np.asarray(arr, dtype=np.int64)
+    # return_inverse在排序时顺带得到排名；先np.unique再np.searchsorted
+    # 需要额外n次随机位置的二分查找，400000个元素时慢一个数量级
+    uniq, ranks = np.unique(arr_np, return_inverse=True)
+    ranks = ranks.reshape(-1).astype(dtype) + 1  # 1-based排名
+    
+    return ranks, len(uniq)
@@ -9,50 +9,22 @@
 
 解决方案：
 1. 朴素算法：O(n^2)时间复杂度，适用于小规模数据
-2. 优化算法：O(n log n)时间复杂度，使用树状数组和坐标压缩
+2. 优化算法：O(n log n)时间复杂度，基于排序的闭式解
+3. 树状数组算法：O(n log n)时间复杂度，使用树状数组和坐标压缩
 
 作者：AI Assistant
 日期：2024
 """
 
-import random
 import time
 from typing import List, Tuple
 import sys
 
-class FenwickTree:
-    """
-    树状数组（Binary Indexed Tree）实现
-    支持单点更新和前缀查询，时间复杂度O(log n)
-    """
-    
-    def __init__(self, size: int):
-        self.size = size
-        self.count_tree = [0] * (size + 1)  # 计数树
-        self.sum_tree = [0] * (size + 1)    # 求和树
-    
-    def update(self, idx: int, val: int):
-        """在位置idx添加一个值为val的元素"""
-        while idx <= self.size:
-            self.count_tree[idx] += 1
-            self.sum_tree[idx] += val
-            idx += idx & (-idx)
-    
-    def query_count(self, idx: int) -> int:
-        """查询前idx个位置的元素个数"""
-        count = 0
-        while idx > 0:
-            count += self.count_tree[idx]
-            idx -= idx & (-idx)
-        return count
-    
-    def query_sum(self, idx: int) -> int:
-        """查询前idx个位置的元素和"""
-        total = 0
-        while idx > 0:
-            total += self.sum_tree[idx]
-            idx -= idx & (-idx)
-        return total
+import numpy as np
+
+import fenwick
+from common import get_unique_values_streaming
+from sum_positive_differences import calculate_positive_differences_sum_optimized
 
 def calculate_positive_differences_naive(arr: List[int]) -> int:
     """
@@ -65,6 +37,10 @@ def calculate_positive_differences_naive(arr: List[int]) -> int:
     Returns:
         所有正差值的累加和
     """
+    # 逐元素访问Python整数比访问NumPy标量快得多
+    if isinstance(arr, np.ndarray):
+        arr = arr.tolist()
+    
     total_sum = 0
     n = len(arr)
     
@@ -79,7 +55,22 @@ def calculate_positive_differences_naive(arr: List[int]) -> int:
 def calculate_positive_differences_optimized(arr: List[int]) -> int:
     """
     优化算法：O(n log n)时间复杂度
-    使用坐标压缩和树状数组优化计算
+    基于排序的闭式解，不需要树状数组，
+    实现见sum_positive_differences.calculate_positive_differences_sum_optimized
+    
+    Args:
+        arr: 输入数组
+    
+    Returns:
+        所有正差值的累加和
+    """
+    return calculate_positive_differences_sum_optimized(arr)
+
+def calculate_positive_differences_fenwick(arr: List[int], ranks: np.ndarray = None,
+                                          unique_count: int = None) -> int:
+    """
+    树状数组算法：O(n log n)时间复杂度
+    使用坐标压缩和Numba编译的树状数组计算
     
     核心思想：
     对于每个位置j的元素arr[j]，我们需要计算：
@@ -89,6 +80,8 @@ def calculate_positive_differences_optimized(arr: List[int]) -> int:
     
     Args:
         arr: 输入数组
+        ranks: 可选，与arr一一对应的1-based坐标压缩结果，多次调用时可复用
+        unique_count: 可选，与ranks一同给出的不同值个数
     
     Returns:
         所有正差值的累加和
@@ -97,36 +90,17 @@ def calculate_positive_differences_optimized(arr: List[int]) -> int:
     if n <= 1:
         return 0
     
-    # 坐标压缩：将数组中的值映射到1到k的范围内
-    sorted_values = sorted(set(arr))
-    value_to_rank = {v: i + 1 for i, v in enumerate(sorted_values)}
-    
-    # 初始化树状数组
-    ft = FenwickTree(len(sorted_values))
-    total_sum = 0
-    
-    for j in range(n):
-        current_val = arr[j]
-        current_rank = value_to_rank[current_val]
-        
-        # 查询所有小于current_val的元素
-        if current_rank > 1:
-            # 小于current_val的元素个数
-            smaller_count = ft.query_count(current_rank - 1)
-            # 小于current_val的元素总和
-            smaller_sum = ft.query_sum(current_rank - 1)
-            
-            # 计算当前元素对答案的贡献
-            # current_val与之前所有较小元素的差值之和
-            contribution = current_val * smaller_count - smaller_sum
-            total_sum += contribution
-        
-        # 将当前元素加入树状数组
-        ft.update(current_rank, current_val)
+    # 编译内核（Cython回退为const int64_t[::1]）只接受连续数组
+    arr_np = np.ascontiguousarray(arr, dtype=np.int64)
+    if ranks is None:
+        # 坐标压缩：将数组中的值映射到1到k的范围内
+        ranks, unique_count = get_unique_values_streaming(arr_np, np.int64)
+    ranks = np.ascontiguousarray(ranks, dtype=np.int64)
     
-    return total_sum
+    # 整个主循环在编译后的代码中执行
+    return int(fenwick.compute_positive_diff(arr_np, ranks, unique_count))
 
-def generate_test_array(size: int, max_value: int, seed: int = None) -> List[int]:
+def generate_test_array(size: int, max_value: int, seed: int = None) -> np.ndarray:
     """
     生成测试用的随机数组
     
@@ -136,12 +110,9 @@ def generate_test_array(size: int, max_value: int, seed: int = None) -> List[int
         seed: 随机种子，用于结果复现
     
     Returns:
-        随机整数数组
+        随机整数数组（int64）
     """
-    if seed is not None:
-        random.seed(seed)
-    
-    return [random.randint(0, max_value) for _ in range(size)]
+    return np.random.default_rng(seed).integers(0, max_value + 1, size=size, dtype=np.int64)
 
 def verify_algorithms() -> bool:
     """
@@ -166,14 +137,17 @@ def verify_algorithms() -> bool:
     for i, (test_arr, expected) in enumerate(test_cases):
         result_naive = calculate_positive_differences_naive(test_arr)
         result_optimized = calculate_positive_differences_optimized(test_arr)
+        result_fenwick = calculate_positive_differences_fenwick(test_arr)
         
-        passed = (result_naive == expected and result_optimized == expected)
+        passed = (result_naive == expected and result_optimized == expected
+                  and result_fenwick == expected)
         all_passed = all_passed and passed
         
         print(f"测试用例 {i+1}: {test_arr}")
         print(f"  期望结果: {expected}")
         print(f"  朴素算法: {result_naive}")
         print(f"  优化算法: {result_optimized}")
+        print(f"  树状数组: {result_fenwick}")
         print(f"  测试结果: {'✓ 通过' if passed else '✗ 失败'}")
         print()
     
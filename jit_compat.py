@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编译加速相关的可选依赖处理
+
+- numba：可用时导出其njit/prange；不可用时njit退化为直接返回原函数的装饰器，
+  prange退化为range，被装饰的函数按普通Python函数执行
+- Cython：install_pyximport注册pyximport，使.pyx模块在首次导入时编译；
+  各.pyxbld文件共用这里的make_ext编译参数
+"""
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """numba不可用时的替代装饰器，直接返回原函数"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+def install_pyximport():
+    """注册pyximport；未安装Cython时抛出ImportError"""
+    import pyximport
+    pyximport.install(language_level=3)
+
+def make_ext(modname, pyxfilename):
+    """pyximport构建参数：开启-O3与本机指令集"""
+    from setuptools import Extension
+    return Extension(name=modname,
+                     sources=[pyxfilename],
+                     extra_compile_args=['-O3', '-march=native'])
@@ -8,93 +8,66 @@
 2. 压缩树状数组：使用更紧凑的数据结构
 3. 原地操作：减少临时变量的使用
 4. 分块处理：对于超大数组采用分块策略
-5. 垃圾回收优化：及时释放不需要的内存
+5. 垃圾回收优化：计算期间暂停自动回收，不在热路径上强制回收
 
 作者：AI Assistant
 日期：2024
 """
 
-import random
 import time
 import gc
 from typing import List, Iterator, Tuple
 import sys
-from collections import defaultdict
+
+import numpy as np
+
+from common import gc_paused, get_unique_values_streaming
 
 class CompactFenwickTree:
     """
     紧凑型树状数组实现
-    使用字典存储稀疏数据，节省内存
+    坐标压缩后下标稠密地落在[1, size]内，使用预分配的数组连续存储，
+    不再有字典的哈希开销和Python整数对象。计数不超过n，使用int32；
+    求和可达n*max_value，使用int64
+
+    预先展开每个下标的更新/查询路径、改用花式索引一次访问整条路径的做法
+    实测更慢：每步的NumPy调用开销抵消了省下的位运算，还要多占约30MB路径表
     """
     
-    def __init__(self):
-        self.count_tree = defaultdict(int)
-        self.sum_tree = defaultdict(int)
-        self.max_idx = 0
+    def __init__(self, size: int):
+        self.size = size
+        self.count_tree = np.zeros(size + 1, dtype=np.int32)
+        self.sum_tree = np.zeros(size + 1, dtype=np.int64)
     
     def update(self, idx: int, val: int):
         """在位置idx添加一个值为val的元素"""
-        self.max_idx = max(self.max_idx, idx)
-        original_idx = idx
-        while idx > 0 and idx <= self.max_idx + 1000:
-            self.count_tree[idx] += 1
-            self.sum_tree[idx] += val
+        count_tree = self.count_tree
+        sum_tree = self.sum_tree
+        while idx <= self.size:
+            count_tree[idx] += 1
+            sum_tree[idx] += val
             idx += idx & (-idx)
     
-    def query_count(self, idx: int) -> int:
-        """查询前idx个位置的元素个数"""
-        count = 0
-        while idx > 0:
-            count += self.count_tree[idx]
-            idx -= idx & (-idx)
-        return count
-    
-    def query_sum(self, idx: int) -> int:
-        """查询前idx个位置的元素和"""
-        total = 0
+    def query(self, idx: int) -> Tuple[int, int]:
+        """一次遍历同时查询前idx个位置的元素个数与元素和"""
+        count = total = 0
+        count_tree = self.count_tree
+        sum_tree = self.sum_tree
         while idx > 0:
-            total += self.sum_tree[idx]
+            count += count_tree[idx]
+            total += sum_tree[idx]
             idx -= idx & (-idx)
-        return total
-    
-    def clear_unused(self):
-        """清理未使用的内存"""
-        # 移除值为0的项
-        self.count_tree = defaultdict(int, {k: v for k, v in self.count_tree.items() if v != 0})
-        self.sum_tree = defaultdict(int, {k: v for k, v in self.sum_tree.items() if v != 0})
-
-def get_unique_values_streaming(arr: List[int]) -> Tuple[dict, int]:
-    """
-    流式获取唯一值并建立映射，节省内存
-    
-    Args:
-        arr: 输入数组
-    
-    Returns:
-        (value_to_rank, unique_count)
-    """
-    unique_values = set()
-    
-    # 第一遍：收集唯一值
-    for val in arr:
-        unique_values.add(val)
-    
-    # 排序并建立映射
-    sorted_values = sorted(unique_values)
-    value_to_rank = {v: i + 1 for i, v in enumerate(sorted_values)}
-    
-    # 清理临时变量
-    del unique_values, sorted_values
-    gc.collect()
-    
-    return value_to_rank, len(value_to_rank)
+        return int(count), int(total)
 
-def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
+def calculate_positive_differences_memory_optimized(arr: List[int], ranks: np.ndarray = None,
+                                                     unique_count: int = None) -> int:
     """
     内存优化版本：O(n log n)时间复杂度，优化内存使用
     
     Args:
         arr: 输入数组
+        ranks: 可选，get_unique_values_streaming(arr)的结果，多次调用时可复用
+        unique_count: 可选，与ranks一同给出的不同值个数
     
     Returns:
         所有正差值的累加和
@@ -103,43 +76,37 @@ def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
     if n <= 1:
         return 0
     
-    # 流式坐标压缩
-    value_to_rank, unique_count = get_unique_values_streaming(arr)
+    # 坐标压缩（调用方已提供时直接复用）
+    arr_np = np.asarray(arr, dtype=np.int64)
+    if ranks is None:
+        ranks, unique_count = get_unique_values_streaming(arr_np)
     
     # 使用紧凑型树状数组
-    ft = CompactFenwickTree()
+    ft = CompactFenwickTree(unique_count)
     total_sum = 0
     
     # 分批处理以减少内存峰值
     batch_size = min(10000, n // 10 + 1)
     
-    for batch_start in range(0, n, batch_size):
-        batch_end = min(batch_start + batch_size, n)
-        
-        for j in range(batch_start, batch_end):
-            current_val = arr[j]
-            current_rank = value_to_rank[current_val]
+    # 计算期间暂停自动垃圾回收
+    with gc_paused():
+        for batch_start in range(0, n, batch_size):
+            batch_end = min(batch_start + batch_size, n)
             
-            # 查询所有小于current_val的元素
-            if current_rank > 1:
-                smaller_count = ft.query_count(current_rank - 1)
-                smaller_sum = ft.query_sum(current_rank - 1)
-                
-                # 计算当前元素对答案的贡献
-                contribution = current_val * smaller_count - smaller_sum
-                total_sum += contribution
+            # 每批转换为Python整数，避免逐元素访问NumPy标量
+            batch_vals = arr_np[batch_start:batch_end].tolist()
+            batch_ranks = ranks[batch_start:batch_end].tolist()
             
-            # 将当前元素加入树状数组
-            ft.update(current_rank, current_val)
-        
-        # 定期清理未使用的内存
-        if batch_start % (batch_size * 5) == 0:
-            ft.clear_unused()
-            gc.collect()
-    
-    # 最终清理
-    del ft, value_to_rank
-    gc.collect()
+            for current_val, current_rank in zip(batch_vals, batch_ranks):
+                # 查询所有小于current_val的元素
+                if current_rank > 1:
+                    smaller_count, smaller_sum = ft.query(current_rank - 1)
+                    
+                    # 计算当前元素对答案的贡献
+                    total_sum += current_val * smaller_count - smaller_sum
+                
+                # 将当前元素加入树状数组
+                ft.update(current_rank, current_val)
     
     return total_sum
 
@@ -158,27 +125,26 @@ def calculate_positive_differences_chunked(arr: List[int], chunk_size: int = 500
     if n <= chunk_size:
         return calculate_positive_differences_memory_optimized(arr)
     
+    arr_np = np.asarray(arr, dtype=np.int64)
     total_sum = 0
     
     # 分块处理
     for i in range(0, n, chunk_size):
         chunk_end = min(i + chunk_size, n)
-        chunk = arr[i:chunk_end]
+        chunk = arr_np[i:chunk_end]  # 视图，不复制
         
         # 计算块内的贡献
         chunk_sum = calculate_positive_differences_memory_optimized(chunk)
         total_sum += chunk_sum
         
-        # 计算跨块的贡献
-        for j in range(chunk_end, n):
-            for k in range(i, chunk_end):
-                diff = arr[j] - arr[k]
-                if diff > 0:
-                    total_sum += diff
-        
-        # 清理内存
-        del chunk
-        gc.collect()
+        # 计算跨块的贡献：对块排序并求前缀和，
+        # 后续每个元素x的贡献为 x * count_le(x) - sum_le(x)
+        later = arr_np[chunk_end:]
+        if later.size > 0:
+            sorted_chunk = np.sort(arr_np[i:chunk_end])
+            prefix = np.concatenate(([0], np.cumsum(sorted_chunk)))
+            idx = np.searchsorted(sorted_chunk, later, side='right')
+            total_sum += int((later * idx - prefix[idx]).sum())
         
         print(f"已处理 {chunk_end}/{n} 个元素")
     
@@ -197,7 +163,7 @@ def get_memory_usage() -> float:
         import sys
         return sys.getsizeof([]) / 1024 / 1024
 
-def generate_test_array_memory_efficient(size: int, max_value: int, seed: int = None) -> List[int]:
+def generate_test_array_memory_efficient(size: int, max_value: int, seed: int = None) -> np.ndarray:
     """
     内存高效的测试数组生成
     
@@ -207,13 +173,9 @@ def generate_test_array_memory_efficient(size: int, max_value: int, seed: int =
         seed: 随机种子
     
     Returns:
-        随机整数数组
+        随机整数数组（int64），直接生成ndarray，不构造Python整数列表
     """
-    if seed is not None:
-        random.seed(seed)
-    
-    # 使用生成器减少内存占用
-    return [random.randint(0, max_value) for _ in range(size)]
+    return np.random.default_rng(seed).integers(0, max_value + 1, size=size, dtype=np.int64)
 
 def memory_usage_test():
     """
@@ -240,7 +202,7 @@ def memory_usage_test():
         
         # 导入原始算法进行对比
         from complete_solution import calculate_positive_differences_optimized
-        result_original = calculate_positive_differences_optimized(arr.copy())
+        result_original = calculate_positive_differences_optimized(arr)
         
         original_time = time.time() - start_time
         original_memory = get_memory_usage()
@@ -287,6 +249,9 @@ def solve_main_problem_memory_optimized():
     print("内存优化版本：400000长度数组的正差值累加和")
     print("=" * 70)
     
+    # 开始前回收一次，之后的计算过程不再强制回收
+    gc.collect()
+    
     # 问题参数
     array_size = 400000
     max_element_value = 100000000
@@ -1,126 +1,128 @@
+import os
 import random
 import time
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
+
+import fenwick
+from common import get_unique_values_streaming
 
 def calculate_positive_differences_sum_efficient(arr: List[int]) -> int:
     """
-    高效算法：O(n log n)时间复杂度
-    使用归并排序的思想，在合并过程中计算贡献
-    
-    核心思想：
-    对于每个元素arr[j]，计算有多少个在它之前的元素arr[i] (i<j) 满足arr[j] > arr[i]
-    以及这些差值的总和
+    高效算法入口：直接使用坐标压缩的离线向量化算法
     """
-    n = len(arr)
-    if n <= 1:
-        return 0
+    return calculate_with_coordinate_compression(arr)
+
+def count_and_sum_smaller_before(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    离线向量化计算：对每个位置j，求i<j且arr[i]<arr[j]的元素个数与元素和
     
-    # 创建索引数组，保持原始位置信息
-    indexed_arr = [(arr[i], i) for i in range(n)]
+    自底向上的分治（CDQ）：每一层把宽度为w的相邻两块合并，
+    左块中的元素对右块中值更大的元素产生贡献。每层只需一次按
+    (块号, 值, 左右)排序和两次前缀和，全部工作都在NumPy的C循环中完成，
+    共O(log n)层。
     
-    total_sum = 0
+    Args:
+        arr: int64数组
     
-    def merge_and_count(left_half, right_half):
-        nonlocal total_sum
-        merged = []
-        i = j = 0
-        
-        while i < len(left_half) and j < len(right_half):
-            left_val, left_idx = left_half[i]
-            right_val, right_idx = right_half[j]
-            
-            if left_idx < right_idx:  # 保证i < j的条件
-                if right_val > left_val:  # arr[j] - arr[i] > 0
-                    # right_val会与left_half中所有剩余元素形成正差值
-                    for k in range(i, len(left_half)):
-                        if left_half[k][1] < right_idx:  # 确保索引条件
-                            diff = right_val - left_half[k][0]
-                            if diff > 0:
-                                total_sum += diff
-                merged.append(right_half[j])
-                j += 1
-            else:
-                merged.append(left_half[i])
-                i += 1
-        
-        merged.extend(left_half[i:])
-        merged.extend(right_half[j:])
-        return merged
-    
-    def merge_sort_with_count(arr_segment):
-        if len(arr_segment) <= 1:
-            return arr_segment
+    Returns:
+        (count_less, sum_less)，长度均为n
+    """
+    n = arr.size
+    count_less = np.zeros(n, dtype=np.int64)
+    sum_less = np.zeros(n, dtype=np.int64)
+    if n <= 1:
+        return count_less, sum_less
+    
+    # 坐标压缩：相等的值得到相同的rank，保证只统计严格小于的元素
+    ranks, _ = get_unique_values_streaming(arr, np.int64)
+    ranks -= 1
+    rank_span = 2 * (int(ranks.max()) + 1)
+    
+    # order中保存按(块号, 值)排好序的原始位置，初始每块只有一个元素
+    order = np.arange(n, dtype=np.int64)
+    width = 1
+    while width < n:
+        block = order // (2 * width)
+        is_left = (order & width) == 0
+        # 值相等时右块元素排在左块元素之前，这样不会把相等的值计入
+        key = block * rank_span + 2 * ranks[order] + is_left
+        # 每块由两段已有序的序列组成，稳定排序可以利用这一点
+        perm = np.argsort(key, kind='stable')
+        order = order[perm]
+        block = block[perm]
+        is_left = is_left[perm]
         
-        mid = len(arr_segment) // 2
-        left = merge_sort_with_count(arr_segment[:mid])
-        right = merge_sort_with_count(arr_segment[mid:])
+        left_count = np.cumsum(is_left)
+        left_sum = np.cumsum(np.where(is_left, arr[order], 0))
+        # 排序后第b块恰好占据区间[b*2w, (b+1)*2w)，减去块起点之前的前缀
+        block_start = block * (2 * width)
+        has_prefix = block_start > 0
+        prev = np.where(has_prefix, block_start - 1, 0)
+        base_count = np.where(has_prefix, left_count[prev], 0)
+        base_sum = np.where(has_prefix, left_sum[prev], 0)
         
-        return merge_and_count(left, right)
+        is_right = ~is_left
+        targets = order[is_right]
+        count_less[targets] += (left_count - base_count)[is_right]
+        sum_less[targets] += (left_sum - base_sum)[is_right]
+        width *= 2
     
-    # 由于上述归并方法复杂度较高，我们使用更直接的优化方法
-    # 使用Fenwick Tree (Binary Indexed Tree) 来优化
-    return calculate_with_coordinate_compression(arr)
+    return count_less, sum_less
 
 def calculate_with_coordinate_compression(arr: List[int]) -> int:
     """
-    使用坐标压缩和树状数组的高效算法
+    使用坐标压缩的离线向量化算法
+    时间复杂度: O(n log^2 n)（全部在NumPy中执行）
+    
+    对于每个元素arr[j]，贡献为 arr[j] * count_less - sum_less，
+    count_less/sum_less由count_and_sum_smaller_before一次性求出。
+    """
+    n = len(arr)
+    if n <= 1:
+        return 0
+    
+    arr_np = np.asarray(arr, dtype=np.int64)
+    count_less, sum_less = count_and_sum_smaller_before(arr_np)
+    
+    return int((arr_np * count_less - sum_less).sum())
+
+def calculate_with_octal_tree(arr: List[int]) -> int:
+    """
+    使用坐标压缩和八叉索引树的算法
     时间复杂度: O(n log n)
+    
+    分支因子由2提高到8，树高由约log2(n)=19层降为log8(n)=7层；
+    每层查询累加的至多7个兄弟节点连续存放在同一缓存行内。
     """
     n = len(arr)
     if n <= 1:
         return 0
     
-    # 坐标压缩
-    sorted_values = sorted(set(arr))
-    value_to_rank = {v: i + 1 for i, v in enumerate(sorted_values)}
+    arr_np = np.asarray(arr, dtype=np.int64)
+    ranks, unique_count = get_unique_values_streaming(arr_np, np.int64)
     
-    # Fenwick Tree for counting and sum
-    class FenwickTree:
-        def __init__(self, size):
-            self.size = size
-            self.count_tree = [0] * (size + 1)
-            self.sum_tree = [0] * (size + 1)
-        
-        def update(self, idx, val):
-            while idx <= self.size:
-                self.count_tree[idx] += 1
-                self.sum_tree[idx] += val
-                idx += idx & (-idx)
-        
-        def query_count(self, idx):
-            count = 0
-            while idx > 0:
-                count += self.count_tree[idx]
-                idx -= idx & (-idx)
-            return count
-        
-        def query_sum(self, idx):
-            total = 0
-            while idx > 0:
-                total += self.sum_tree[idx]
-                idx -= idx & (-idx)
-            return total
-    
-    ft = FenwickTree(len(sorted_values))
-    total_sum = 0
+    return int(fenwick.compute_positive_diff_octal(arr_np, ranks, unique_count))
+
+def calculate_with_parallel_tiles(arr: List[int], tiles: int = None) -> int:
+    """
+    使用按值分片的并行树状数组算法
+    时间复杂度: O(n * tiles + n log n)，各片分摊到不同的CPU核上
     
-    for j in range(n):
-        current_val = arr[j]
-        current_rank = value_to_rank[current_val]
-        
-        # 查询所有小于current_val的元素
-        if current_rank > 1:
-            smaller_count = ft.query_count(current_rank - 1)
-            smaller_sum = ft.query_sum(current_rank - 1)
-            
-            # 计算当前元素与之前所有较小元素的正差值之和
-            contribution = current_val * smaller_count - smaller_sum
-            total_sum += contribution
-        
-        # 将当前元素加入树状数组
-        ft.update(current_rank, current_val)
+    每片各自扫描一遍数组，片数取CPU核数时每个核的工作量约为O(n)。
+    """
+    n = len(arr)
+    if n <= 1:
+        return 0
     
-    return total_sum
+    if tiles is None:
+        tiles = os.cpu_count() or 1
+    
+    arr_np = np.asarray(arr, dtype=np.int64)
+    ranks, unique_count = get_unique_values_streaming(arr_np, np.int64)
+    
+    return int(fenwick.compute_positive_diff_tiled(arr_np, ranks, unique_count, tiles))
 
 def calculate_positive_differences_sum_simple_optimized(arr: List[int]) -> int:
     """
@@ -161,11 +163,15 @@ def test_algorithms():
     for i, test_case in enumerate(test_cases):
         result_simple = calculate_positive_differences_sum_simple_optimized(test_case)
         result_efficient = calculate_with_coordinate_compression(test_case)
+        result_octal = calculate_with_octal_tree(test_case)
+        result_tiled = calculate_with_parallel_tiles(test_case, tiles=3)
         
         print(f"测试用例 {i+1}: {test_case}")
         print(f"简单算法结果: {result_simple}")
         print(f"高效算法结果: {result_efficient}")
-        print(f"结果一致: {result_simple == result_efficient}")
+        print(f"八叉树结果: {result_octal}")
+        print(f"并行分片结果: {result_tiled}")
+        print(f"结果一致: {result_simple == result_efficient == result_octal == result_tiled}")
         print()
 
 def main():
